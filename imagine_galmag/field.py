@@ -1,5 +1,9 @@
 # %% IMPORTS
 
+# Built-in imports
+import tempfile
+import weakref
+
 # Package imports
 import astropy.units as u
 import numpy as np
@@ -12,35 +16,150 @@ import galmag.halo_profiles as halo_prof
 
 
 # IMAGINE imports
-import imagine
 from imagine.fields import MagneticField
 from imagine.tools import req_attr
 
 __all__ = ['GalMagDiskField', 'GalMagHaloField']
 
+# Units used by GalMag (composite units are built only once, here)
+_KPC = u.kpc
+_MICROGAUSS = u.microgauss
+_DIMENSIONLESS = u.dimensionless_unscaled
+_INVERSE_SECOND = 1/u.s
+_KM_PER_S = u.km/u.s
+_CM2_PER_S = u.cm*u.cm/u.s
+
+
+# GalMag generator arguments (and the corresponding generator cache key)
+# of each IMAGINE grid object, indexed by the grid itself
+_grid_details_cache = weakref.WeakKeyDictionary()
+
+
+def _galmag_grid_details(grid):
+    """
+    Converts the details of an IMAGINE grid into the arguments of a
+    GalMag generator (this is done only once for each grid object)
+
+    Returns
+    -------
+    kwargs : dict
+        Box (in kpc), resolution and grid type
+    key : tuple
+        Hashable representation of the above
+    """
+    details = _grid_details_cache.get(grid)
+    if details is None:
+        # GalMag uses standard units
+        box_dimensionless = grid.box.to_value(_KPC)
+        kwargs = {'box': box_dimensionless,
+                  'resolution': grid.resolution,
+                  'grid_type': grid.grid_type}
+        key = (tuple(box_dimensionless.ravel().tolist()),
+               tuple(grid.resolution), grid.grid_type)
+        details = (kwargs, key)
+        _grid_details_cache[grid] = details
+    return details
+
+
+def _hashable(value):
+    """
+    Hashable representation of a parameter value, comparable by value
+    (arrays and quantities are represented by their contents)
+    """
+    if isinstance(value, u.Quantity):
+        return (_hashable(value.value), value.unit.to_string())
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+def _parameters_key(*parameter_dicts):
+    """
+    Key representing the contents of the given parameter dictionaries,
+    which can be compared with the key of other parameter values
+    """
+    return frozenset((name, _hashable(value))
+                     for parameters in parameter_dicts
+                     for name, value in parameters.items())
+
+
 class GalMagMagneticFieldBase(MagneticField):
     """
     Base class for GalMag fields
     """
+    # GalMag generators shared by all instances using the same grid,
+    # indexed by (generator class, box, resolution, grid type). Each
+    # instance keeps its generator alive, which is discarded from here
+    # once no longer used by any instance.
+    # NB this is not protected by a lock: instances should not be
+    # created concurrently from different threads.
+    _generator_cache = weakref.WeakValueDictionary()
+
     def __init__(self, grid, *, parameters=dict(), ensemble_size=None,
-                 ensemble_seeds=None, dependencies={}, keep_galmag_field=False):
+                 ensemble_seeds=None, dependencies={}, keep_galmag_field=False,
+                 output_dtype=np.float64, reuse_output_buffer=False,
+                 mmap_output=False):
 
         self.keep_galmag_field = keep_galmag_field
-        # GalMag uses standard units
-        box_dimensionless = grid.box.to_value(u.kpc)
-
-        # Prepares a GalMag field generator with grid details
-        self.galmag_gen = self.galmag_generator_class(box=box_dimensionless,
-                                                      resolution=grid.resolution,
-                                                      grid_type=grid.grid_type)
-        # Caches galmag object
+        # Floating point type of the field arrays returned by compute_field
+        self.output_dtype = np.dtype(output_dtype)
+        if not np.issubdtype(self.output_dtype, np.floating):
+            raise ValueError('output_dtype must be a floating point type, '
+                             'not {}'.format(self.output_dtype))
+        # If True, the field arrays returned by successive calls to
+        # compute_field share the same memory (and are overwritten)
+        self.reuse_output_buffer = reuse_output_buffer
+        self._output_buffer = None
+        # If True, the field arrays are backed by a temporary file
+        self.mmap_output = mmap_output
+        # Stores the grid details needed by the GalMag field generator,
+        # which is only prepared when first needed (see galmag_gen)
+        self._galmag_gen_kwargs, grid_key = _galmag_grid_details(grid)
+        self._galmag_gen_key = (self.galmag_generator_class,) + grid_key
+        self._galmag_gen = None
+        # Keeps the GalMag field object (if keep_galmag_field is True)
         self.galmag = None
+        # Caches the final field array (if keep_galmag_field is True) and
+        # the key of the parameter values used to compute it
+        self._cached_field = None
+        self._cached_key = None
         # Any functions (e.g. profiles) and switches (e.g. 'disk_field_decay')
         # are stored (by subclasses) in the following attribute
         self._field_options = {}
 
         super().__init__(grid=grid, parameters=parameters, ensemble_size=ensemble_size,
                          ensemble_seeds=ensemble_seeds, dependencies=dependencies)
+        # The grid is fixed, thus so is the shape of the field arrays
+        self._data_shape = tuple(self.data_shape)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The GalMag generator is not pickled: it is prepared again
+        # (or taken from the cache) when needed after unpickling
+        state['_galmag_gen'] = None
+        # Neither are the (reusable) output buffer nor the (potentially
+        # large) cached results, which are recomputed after unpickling
+        state['_output_buffer'] = None
+        state['galmag'] = None
+        state['_cached_field'] = None
+        state['_cached_key'] = None
+        return state
+
+    @property
+    def galmag_gen(self):
+        """
+        GalMag field generator for the grid of this field
+        """
+        if self._galmag_gen is None:
+            # Reuses the generator of any previous instance with the same grid
+            galmag_gen = self._generator_cache.get(self._galmag_gen_key)
+            if galmag_gen is None:
+                galmag_gen = self.galmag_generator_class(**self._galmag_gen_kwargs)
+                self._generator_cache[self._galmag_gen_key] = galmag_gen
+            self._galmag_gen = galmag_gen
+        return self._galmag_gen
 
     @property
     @req_attr
@@ -50,34 +169,154 @@ class GalMagMagneticFieldBase(MagneticField):
         """
         return self.PARAMETER_UNITS
 
+    def _derived_parameters(self, converted_parameters):
+        """
+        GalMag parameters computed from the IMAGINE parameters
+
+        Subclasses override this to convert the IMAGINE parametrization into
+        the one used natively by GalMag. This must not modify `parameters`
+        nor `converted_parameters`.
+
+        Parameters
+        ----------
+        converted_parameters : dict
+            The IMAGINE parameters, already converted to GalMag's units
+        """
+        return {}
+
+    def _compute_induction_numbers(self, *sources):
+        """
+        Dimensionless dynamo numbers (in GalMag's parametrization) computed
+        from the given dimensional parameters
+        """
+        return {}
+
+    def _galmag_parameters(self):
+        """
+        Dictionary of parameters, in GalMag's native form and units,
+        to be passed to the GalMag generator
+        """
+        parameter_units = self.parameter_units
+        parameters = {}
+        for pname, pval in self.parameters.items():
+            if pname in parameter_units and hasattr(pval, 'unit'):
+                # Converts to default parameter units
+                # (if unit is absent, assumes default)
+                pval = pval.to_value(parameter_units[pname])
+            parameters[pname] = pval
+
+        # Includes the parameters derived from the above (e.g. dimensionless
+        # dynamo numbers), which are already in GalMag's native form
+        parameters.update(self._derived_parameters(parameters))
+        # Includes GalMag "switch-like" parameters
+        parameters.update(self._field_options)
+        return parameters
+
+    def _galmag_components(self):
+        """
+        Computes the field using GalMag (keeping the GalMag field object in
+        the `galmag` attribute, if keep_galmag_field is True)
+
+        Returns
+        -------
+        B_stacked : numpy.ndarray
+            Array of shape (3, Nx, Ny, Nz) and type output_dtype (see
+            `_get_output_buffer`) containing the Cartesian components of
+            the field, in microgauss
+        """
+        # Creates the field using GalMag's generator
+        galmag_B = self.galmag_gen.get_B_field(**self._galmag_parameters())
+
+        if self.keep_galmag_field:
+            self.galmag = galmag_B
+
+        # Stores the components one after the other (i.e. each of the
+        # writes is contiguous), casting to output_dtype while copying
+        B_stacked = self._get_output_buffer()
+        for B_plane, B_component in zip(B_stacked, (galmag_B.x, galmag_B.y,
+                                                    galmag_B.z)):
+            np.copyto(B_plane, B_component, casting='same_kind')
+        return B_stacked
+
+    def _get_output_buffer(self):
+        """
+        Array of shape (3, Nx, Ny, Nz) where the field components are stored,
+        which is kept and reused in subsequent calls if reuse_output_buffer
+        is True, and is memory-mapped to a temporary file if mmap_output
+        is True
+        """
+        buffer = self._output_buffer
+        if buffer is None:
+            shape = (3,) + self._data_shape[:-1]
+            if self.mmap_output:
+                # The (anonymous) temporary file is deleted once
+                # the array is no longer in use
+                buffer = np.memmap(tempfile.TemporaryFile(), mode='w+',
+                                   dtype=self.output_dtype, shape=shape)
+            else:
+                buffer = np.empty(shape, dtype=self.output_dtype)
+            if self.reuse_output_buffer:
+                self._output_buffer = buffer
+        return buffer
+
     def compute_field(self, seed):
 
-        if self.galmag is not None:
-            galmag_B = self.galmag
-        else:
-            parameters = {}
-            for pname, pval in self.parameters.items():
-                if pname in self.parameter_units:
-                    # Converts to default parameter units
-                    # (if unit is absent, assumes default)
-                    pval = (pval << self.parameter_units[pname]).value
-                parameters[pname] = pval
+        if self.keep_galmag_field:
+            key = _parameters_key(self.parameters, self._field_options)
+            if key != self._cached_key:
+                # Parameters were modified: discards the cached results
+                self.galmag = None
+                self._cached_field = None
+            elif self._cached_field is not None:
+                # Fast path: returns the cached field
+                return self._cached_field
+
+        B_stacked = self._galmag_components()
+        # Moves the components axis to the end, obtaining a view with the
+        # expected (Nx, Ny, Nz, 3) shape
+        B_field = np.moveaxis(B_stacked, 0, -1) << _MICROGAUSS
+
+        if self.keep_galmag_field:
+            # The same array is returned by subsequent calls,
+            # thus it is protected against accidental modification
+            B_field.flags.writeable = False
+            self._cached_field = B_field
+            self._cached_key = key
+
+        return B_field
+
+    def compute_ensemble(self, seeds):
+        """
+        Computes the field for each of the ensemble seeds
+
+        GalMag fields are deterministic (the seed is not used), thus the
+        field is computed only once and the same (read-only) array is
+        returned for all the ensemble members.
 
-            # Includes GalMag "switch-like" parameters
-            parameters.update(self._field_options)
-            # Creates the field using GalMag's generator
-            galmag_B = self.galmag_gen.get_B_field(**parameters)
+        This is an optional shortcut, which is not used by IMAGINE itself
+        (which calls `compute_field` once per seed). It can be used, e.g.,
+        when assembling ensembles by hand::
 
-            if self.keep_galmag_field:
-                self.galmag = galmag_B
+            B_ensemble = field.compute_ensemble([1, 2, 3])
 
-        B_array = np.empty(self.data_shape)
-        # and saves the pre-computed components
-        B_array[:,:,:,0] = galmag_B.x
-        B_array[:,:,:,1] = galmag_B.y
-        B_array[:,:,:,2] = galmag_B.z
+        Parameters
+        ----------
+        seeds : list
+            Seeds of the ensemble members
 
-        return B_array << u.microgauss
+        Returns
+        -------
+        B_fields : list of astropy.units.Quantity
+            The field of each ensemble member (an empty list if no
+            seeds are given)
+        """
+        if len(seeds) == 0:
+            return []
+        B_field = self.compute_field(seeds[0])
+        if len(seeds) > 1:
+            # The array is shared by the ensemble members
+            B_field.flags.writeable = False
+        return [B_field] * len(seeds)
 
 
 class GalMagDiskField(GalMagMagneticFieldBase):
@@ -85,6 +324,8 @@ class GalMagDiskField(GalMagMagneticFieldBase):
     An IMAGINE field constructed using GalMag's disk magnetic field
     """
     NAME = 'galmag_disk_magnetic_field'
+    # GalMag class used to generate the field
+    galmag_generator_class = B_generator_disk
     # The following is updated dynamically with the normalization of
     # different eigenmodes
     PARAMETER_NAMES = ['disk_height',
@@ -94,17 +335,19 @@ class GalMagDiskField(GalMagMagneticFieldBase):
                        'disk_shear_normalization',
                        'disk_turbulent_diffusivity',
                        'disk_alpha_effect']
-    PARAMETER_UNITS = {'disk_height': u.kpc,
-                       'disk_radius': u.kpc,
-                       'disk_regularization_radius': u.kpc,
-                       'disk_ref_r_cylindrical': u.kpc,
-                       'disk_shear_normalization': 1/u.s,
-                       'disk_turbulent_diffusivity': u.cm*u.cm/u.s,
-                       'disk_alpha_effect': u.km/u.s}
+    PARAMETER_UNITS = {'disk_height': _KPC,
+                       'disk_radius': _KPC,
+                       'disk_regularization_radius': _KPC,
+                       'disk_ref_r_cylindrical': _KPC,
+                       'disk_shear_normalization': _INVERSE_SECOND,
+                       'disk_turbulent_diffusivity': _CM2_PER_S,
+                       'disk_alpha_effect': _KM_PER_S}
 
     def __init__(self, grid, *, parameters=dict(), ensemble_size=None,
                  ensemble_seeds=None, dependencies={}, keep_galmag_field=False,
-                 number_of_modes=None,
+                 output_dtype=np.float64, reuse_output_buffer=False,
+                 mmap_output=False, number_of_modes=None,
+                 keep_mode_basis=False,
                  disk_shear_function=disk_prof.Clemens_Milky_Way_shear_rate, # S(R)
                  disk_rotation_function=disk_prof.Clemens_Milky_Way_rotation_curve, # V(R)
                  disk_height_function=disk_prof.exponential_scale_height, # h(R)
@@ -112,16 +355,38 @@ class GalMagDiskField(GalMagMagneticFieldBase):
                  ):
 
         if number_of_modes is None:
-            number_of_modes = max([int(k[5:]) for k in parameters if 'mode_' in k])
+            number_of_modes = max((int(k[5:]) for k in parameters
+                                   if k.startswith('mode_')), default=None)
+            if number_of_modes is None:
+                raise ValueError('The number of disk modes could not be '
+                                 'inferred, as the parameters contain no '
+                                 '"mode_n" entries: please provide the '
+                                 'number_of_modes keyword argument')
 
         self._number_of_modes = number_of_modes
-        self.galmag_generator_class = B_generator_disk
+        # Includes individual parameters for each disk mode (these are
+        # fixed for a given instance, thus computed only once)
+        modes_list = ['mode_{0:d}'.format(i+1)
+                      for i in range(self._number_of_modes)]
+        self._mode_names = tuple(modes_list)
+        # The field of each individual mode (computed with unit
+        # normalization) and the key of the other parameters used
+        self.keep_mode_basis = keep_mode_basis
+        self._mode_basis = None
+        self._mode_basis_key = None
+        self._parameter_names_cached = self.PARAMETER_NAMES + modes_list
+        self._parameter_units_cached = {name: _MICROGAUSS
+                                        for name in modes_list}
+        self._parameter_units_cached.update(self.PARAMETER_UNITS)
 
         super().__init__(grid=grid, parameters=parameters,
                          ensemble_size=ensemble_size,
                          ensemble_seeds=ensemble_seeds,
                          dependencies=dependencies,
-                         keep_galmag_field=keep_galmag_field)
+                         keep_galmag_field=keep_galmag_field,
+                         output_dtype=output_dtype,
+                         reuse_output_buffer=reuse_output_buffer,
+                         mmap_output=mmap_output)
 
         self._field_options = {'disk_shear_function': disk_shear_function,
                                'disk_rotation_function': disk_rotation_function,
@@ -129,55 +394,158 @@ class GalMagDiskField(GalMagMagneticFieldBase):
                                'disk_field_decay': disk_field_decay,
                                'disk_newman_boundary_condition_envelope':
                                disk_newman_boundary_condition_envelope}
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # The modes basis is recomputed when needed after unpickling
+        state['_mode_basis'] = None
+        state['_mode_basis_key'] = None
+        return state
+
     @property
     def parameter_names(self):
         # Includes individual parameters for each disk mode
-        modes_list = ['mode_{0:d}'.format(i+1)
-                      for i in range(self._number_of_modes)]
-        return self.PARAMETER_NAMES + modes_list
+        return self._parameter_names_cached
 
     @property
     def parameter_units(self):
         # Includes individual parameters for each disk mode
-        param_units_actual = {'mode_{0:d}'.format(i+1): u.microgauss
-                              for i in range(self._number_of_modes)}
-        param_units_actual.update(self.PARAMETER_UNITS)
-        return param_units_actual
+        return self._parameter_units_cached
 
-    def compute_field(self, seed):
+    def _derived_parameters(self, converted_parameters):
         # Constructs GalMag's native disk_modes_normalization parameters
-        disk_mode_norm = []
-        for i in range(self._number_of_modes):
-            name = 'mode_{0:d}'.format(i+1)
-            if name in self.parameters:
-                disk_mode_norm.append((self.parameters[name] << u.microgauss).value)
-            else:
-                disk_mode_norm.append(0)
-        # Provisionally includes disk modes parameter
-        self.parameters['disk_modes_normalization'] = np.array(disk_mode_norm)
+        # (from the modes normalizations, already in microgauss). A new
+        # array is used each time, as GalMag fields keep their parameters
+        disk_mode_norm = np.zeros(self._number_of_modes)
+        for i, name in enumerate(self._mode_names):
+            disk_mode_norm[i] = converted_parameters.get(name, 0)
+
+        induction_numbers = self._compute_induction_numbers(
+            self.parameters['disk_height'],
+            self.parameters['disk_shear_normalization'],
+            self.parameters['disk_alpha_effect'],
+            self.parameters['disk_turbulent_diffusivity'])
+
+        return {'disk_modes_normalization': disk_mode_norm,
+                **induction_numbers}
+
+    def _galmag_components(self):
+        if not self.keep_mode_basis:
+            return super()._galmag_components()
+
+        parameters = self._galmag_parameters()
+        disk_mode_norm = parameters['disk_modes_normalization']
+        self._update_mode_basis(parameters)
+
+        # The field is a linear combination of the individual modes,
+        # computed by a single BLAS call directly into the output buffer
+        B_stacked = self._get_output_buffer()
+        np.dot(disk_mode_norm.astype(self.output_dtype),
+               self._mode_basis.reshape(self._number_of_modes, -1),
+               out=B_stacked.reshape(-1))
+        return B_stacked
+
+    def compute_field_batch(self, modes_normalizations):
+        """
+        Computes the field for several different sets of disk modes
+        normalizations at once, keeping all other parameters fixed
+
+        The field of each mode is computed and all the fields are obtained
+        with a single matrix product. The fields of the modes are kept for
+        subsequent calls only if `keep_mode_basis` is True.
+
+        Parameters
+        ----------
+        modes_normalizations : list of dict
+            Each dictionary contains the mode parameters (e.g. 'mode_1')
+            for one of the fields; absent modes are assumed to vanish
+
+        Returns
+        -------
+        B_fields : astropy.units.Quantity
+            Array of shape (len(modes_normalizations), Nx, Ny, Nz, 3)
+
+        Raises
+        ------
+        ValueError
+            If any of the dictionaries contains a key which is not one of
+            the mode parameters of this field
+        """
+        weights = np.zeros((len(modes_normalizations), self._number_of_modes),
+                           dtype=self.output_dtype)
+        for weights_row, modes in zip(weights, modes_normalizations):
+            unknown_names = set(modes).difference(self._mode_names)
+            if unknown_names:
+                raise ValueError('Unknown disk mode parameter(s) {}, the '
+                                 'modes of this field are {}'.format(
+                                     sorted(unknown_names),
+                                     list(self._mode_names)))
+            for i, name in enumerate(self._mode_names):
+                mode = modes.get(name, 0)
+                # (if unit is absent, assumes microgauss)
+                weights_row[i] = (mode.to_value(_MICROGAUSS)
+                                  if hasattr(mode, 'unit') else mode)
+
+        self._update_mode_basis(self._galmag_parameters())
+        basis = self._mode_basis
+        if not self.keep_mode_basis:
+            # Releases the (potentially large) basis after its use
+            self._mode_basis = None
+            self._mode_basis_key = None
+
+        B_stacked = weights @ basis.reshape(self._number_of_modes, -1)
+        B_stacked = B_stacked.reshape((len(weights),) + basis.shape[1:])
+        # Moves the components axis to the end (without copying)
+        return np.moveaxis(B_stacked, 1, -1) << _MICROGAUSS
+
+    def _update_mode_basis(self, parameters):
+        """
+        Recomputes the modes basis if parameters other than the modes
+        normalizations have changed (or if it was never computed)
 
-        # Shorthands (for clarity)
-        h = self.parameters['disk_height']
-        S = self.parameters['disk_shear_normalization']
-        alpha = self.parameters['disk_alpha_effect']
-        beta = self.parameters['disk_turbulent_diffusivity']
+        Parameters
+        ----------
+        parameters : dict
+            GalMag parameters (disk_modes_normalization is ignored)
+        """
+        other_parameters = {name: pval
+                            for name, pval in self.parameters.items()
+                            if name not in self._mode_names}
+        key = _parameters_key(other_parameters, self._field_options)
+        if key != self._mode_basis_key:
+            self._mode_basis = self._compute_mode_basis(parameters)
+            self._mode_basis_key = key
+
+    def _compute_mode_basis(self, parameters):
+        """
+        Computes the field of each disk mode separately, with unit
+        normalization, storing it in an array of shape (number_of_modes,
+        3, Nx, Ny, Nz) and type output_dtype
 
+        The basis has the same type as the output buffer because np.dot
+        can only write its result (through `out`) into an array of the
+        same type as its inputs.
+        """
+        basis = np.empty((self._number_of_modes, 3) + self._data_shape[:-1],
+                         dtype=self.output_dtype)
+        for i, B_mode in enumerate(basis):
+            unit_mode_norm = np.zeros(self._number_of_modes)
+            unit_mode_norm[i] = 1
+            galmag_B = self.galmag_gen.get_B_field(
+                **{**parameters, 'disk_modes_normalization': unit_mode_norm})
+            for B_plane, B_component in zip(B_mode, (galmag_B.x, galmag_B.y,
+                                                     galmag_B.z)):
+                np.copyto(B_plane, B_component, casting='same_kind')
+        return basis
+
+    def _compute_induction_numbers(self, h, S, alpha, beta):
         # Computes Ralpha
-        Ralpha = ( h*alpha/beta ).to_value(u.dimensionless_unscaled)
-        self.parameters['disk_turbulent_induction'] = Ralpha
+        Ralpha = ( h*alpha/beta ).to_value(_DIMENSIONLESS)
         # Computes local dynamo number
-        Romega = ( h**2*S/beta ).to_value(u.dimensionless_unscaled)
-        self.parameters['disk_dynamo_number'] = Ralpha*Romega
-
-        # Constructs field using superclass
-        field = super().compute_field(seed)
+        Romega = ( h**2*S/beta ).to_value(_DIMENSIONLESS)
 
-        # Removes temporary parameters
-        del self.parameters['disk_modes_normalization']
-        del self.parameters['disk_dynamo_number']
-        del self.parameters['disk_turbulent_induction']
-
-        return field
+        return {'disk_turbulent_induction': Ralpha,
+                'disk_dynamo_number': Ralpha*Romega}
 
 
 class GalMagHaloField(GalMagMagneticFieldBase):
@@ -185,6 +553,8 @@ class GalMagHaloField(GalMagMagneticFieldBase):
     An IMAGINE field constructed using GalMag's halo magnetic field
     """
     NAME = 'galmag_halo_magnetic_field'
+    # GalMag class used to generate the field
+    galmag_generator_class = B_generator_halo
 
     PARAMETER_NAMES = ['halo_radius',
                        'halo_ref_radius',
@@ -196,20 +566,21 @@ class GalMagHaloField(GalMagMagneticFieldBase):
                        'halo_turbulent_diffusivity',
                        'halo_alpha_effect']
 
-    PARAMETER_UNITS = {'halo_radius': u.kpc,
-                       'halo_ref_radius': u.kpc,
-                       'halo_ref_z': u.kpc,
-                       'halo_ref_Bphi': u.microgauss,
-                       'halo_rotation_characteristic_radius': u.kpc,
-                       'halo_rotation_characteristic_height': u.kpc,
-                       'halo_rotation_normalization': u.km/u.s,
-                       'halo_turbulent_diffusivity': u.cm*u.cm/u.s,
-                       'halo_alpha_effect': u.km/u.s}
+    PARAMETER_UNITS = {'halo_radius': _KPC,
+                       'halo_ref_radius': _KPC,
+                       'halo_ref_z': _KPC,
+                       'halo_ref_Bphi': _MICROGAUSS,
+                       'halo_rotation_characteristic_radius': _KPC,
+                       'halo_rotation_characteristic_height': _KPC,
+                       'halo_rotation_normalization': _KM_PER_S,
+                       'halo_turbulent_diffusivity': _CM2_PER_S,
+                       'halo_alpha_effect': _KM_PER_S}
 
 
     def __init__(self, grid, *, parameters=dict(), ensemble_size=None,
                  ensemble_seeds=None, dependencies={}, keep_galmag_field=False,
-                 halo_symmetric_field=True,
+                 output_dtype=np.float64, reuse_output_buffer=False,
+                 mmap_output=False, halo_symmetric_field=True,
                  halo_rotation_function=halo_prof.simple_V,
                  halo_alpha_function=halo_prof.simple_alpha,
                  halo_n_free_decay_modes=4,
@@ -218,12 +589,14 @@ class GalMagHaloField(GalMagMagneticFieldBase):
                  halo_growing_mode_only=False,
                  halo_Galerkin_ngrid=501):
 
-        self.galmag_generator_class = B_generator_halo
         super().__init__(grid=grid, parameters=parameters,
                          ensemble_size=ensemble_size,
                          ensemble_seeds=ensemble_seeds,
                          dependencies=dependencies,
-                         keep_galmag_field=keep_galmag_field)
+                         keep_galmag_field=keep_galmag_field,
+                         output_dtype=output_dtype,
+                         reuse_output_buffer=reuse_output_buffer,
+                         mmap_output=mmap_output)
 
         self._field_options = {'halo_n_free_decay_modes': halo_n_free_decay_modes,
                                'halo_growing_mode_only': halo_growing_mode_only,
@@ -234,25 +607,18 @@ class GalMagHaloField(GalMagMagneticFieldBase):
                                'halo_rotation_function': halo_rotation_function,
                                'halo_alpha_function': halo_alpha_function}
 
-    def compute_field(self, seed):
-        # Shorthands (for clarity)
-        r = self.parameters['halo_radius']
-        V = self.parameters['halo_rotation_normalization']
-        beta = self.parameters['halo_turbulent_diffusivity']
-        alpha = self.parameters['halo_alpha_effect']
+    def _derived_parameters(self, converted_parameters):
+        return self._compute_induction_numbers(
+            self.parameters['halo_radius'],
+            self.parameters['halo_rotation_normalization'],
+            self.parameters['halo_turbulent_diffusivity'],
+            self.parameters['halo_alpha_effect'])
 
+    def _compute_induction_numbers(self, r, V, beta, alpha):
         # Computes Ralpha
-        Ralpha = ( r*alpha/beta ).to_value(u.dimensionless_unscaled)
-        self.parameters['halo_turbulent_induction'] = Ralpha
+        Ralpha = ( r*alpha/beta ).to_value(_DIMENSIONLESS)
         # Computes Romega
-        Romega = ( -r*V/beta  ).to_value(u.dimensionless_unscaled)
-        self.parameters['halo_rotation_induction'] = Romega
-
-        # Constructs field using superclass
-        field = super().compute_field(seed)
-
-        # Removes temporary parameters
-        del self.parameters['halo_rotation_induction']
-        del self.parameters['halo_turbulent_induction']
+        Romega = ( -r*V/beta  ).to_value(_DIMENSIONLESS)
 
-        return field
+        return {'halo_turbulent_induction': Ralpha,
+                'halo_rotation_induction': Romega}
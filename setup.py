@@ -5,6 +5,9 @@ import re
 # Package imports
 from setuptools import find_packages, setup
 
+# Pattern matching the version definition in __version__.py
+_VERSION_RE = re.compile(r"^_*version_* = ['\"]([^'\"]*)['\"]", re.M)
+
 # Get the requirements list
 with open('requirements.txt', 'r') as f:
     requirements = f.read().splitlines()
@@ -14,10 +17,7 @@ with open('imagine_galmag/__version__.py', 'r') as f:
     vf = f.read()
 
 # Obtain version from read-in __version__.py file
-version = re.search(r"^_*version_* = ['\"]([^'\"]*)['\"]", vf, re.M).group(1)
-
-with open('requirements.txt') as f:
-    requirements = f.read().splitlines()
+version = _VERSION_RE.search(vf).group(1)
 
 setup(name="imagine-galmag",
       version=version,
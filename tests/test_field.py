@@ -0,0 +1,132 @@
+"""
+Tests of the IMAGINE-GalMag fields, evaluated on a coarse grid
+"""
+# Package imports
+import astropy.units as u
+import numpy as np
+import pytest
+
+pytest.importorskip('galmag')
+pytest.importorskip('imagine')
+
+# IMAGINE imports
+from imagine.fields.grid import UniformGrid
+
+# IMAGINE-GalMag imports
+from imagine_galmag import GalMagDiskField
+
+
+@pytest.fixture
+def grid():
+    return UniformGrid(box=[[-15, 15], [-15, 15], [-2, 2]]*u.kpc,
+                       resolution=[6, 6, 4])
+
+
+@pytest.fixture
+def disk_parameters():
+    return {'mode_1': 4*u.microgauss,
+            'mode_2': 2*u.microgauss,
+            'mode_4': .3*u.microgauss,
+            'disk_height': 400*u.pc,
+            'disk_radius': 17*u.kpc,
+            'disk_alpha_effect': 1*u.km/u.s,
+            'disk_shear_normalization': -35.36*u.km/u.s/u.kpc,
+            'disk_turbulent_diffusivity': 5e25*u.cm*u.cm/u.s}
+
+
+def test_float32_output(grid, disk_parameters):
+    B64 = GalMagDiskField(grid, parameters=disk_parameters).compute_field(0)
+    B32 = GalMagDiskField(grid, parameters=disk_parameters,
+                          output_dtype=np.float32).compute_field(0)
+
+    assert B32.dtype == np.float32
+    assert B32.shape == B64.shape
+    assert B32.unit == B64.unit
+    # The only difference is the single precision rounding
+    np.testing.assert_allclose(B32.value, B64.value, rtol=1e-6)
+
+
+def test_cached_field_invalidation(grid, disk_parameters):
+    # (copies the values, which are modified in place below)
+    field = GalMagDiskField(grid, parameters={name: value.copy() for name, value
+                                              in disk_parameters.items()},
+                            keep_galmag_field=True)
+    B_before = field.compute_field(0)
+    galmag_before = field.galmag
+    # With unchanged parameters, the cached field is returned
+    assert field.compute_field(1) is B_before
+    assert field.galmag is galmag_before
+    assert not B_before.flags.writeable
+
+    # An equal value (even if a different object) keeps the cache
+    field.parameters['disk_height'] = 400*u.pc
+    assert field.compute_field(2) is B_before
+
+    # A modified value discards it
+    field.parameters['mode_1'] = 1*u.microgauss
+    B_after = field.compute_field(3)
+    assert B_after is not B_before
+    assert field.galmag is not galmag_before
+
+    modified_parameters = dict(disk_parameters, mode_1=1*u.microgauss)
+    B_expected = GalMagDiskField(grid,
+                                 parameters=modified_parameters).compute_field(0)
+    np.testing.assert_allclose(B_after.value, B_expected.value)
+    assert not np.allclose(B_after.value, B_before.value)
+
+    # A value modified in place (i.e. the same object) also discards it
+    field.parameters['disk_radius'] += 3*u.kpc
+    B_inplace = field.compute_field(4)
+    assert B_inplace is not B_after
+
+    modified_parameters['disk_radius'] = 20*u.kpc
+    B_expected = GalMagDiskField(grid,
+                                 parameters=modified_parameters).compute_field(0)
+    np.testing.assert_allclose(B_inplace.value, B_expected.value)
+    assert not np.allclose(B_inplace.value, B_after.value)
+
+
+def test_mode_basis(grid, disk_parameters):
+    B_direct = GalMagDiskField(grid,
+                               parameters=disk_parameters).compute_field(0)
+    field = GalMagDiskField(grid, parameters={name: value.copy() for name, value
+                                              in disk_parameters.items()},
+                            keep_mode_basis=True)
+    tolerance = 1e-10*np.abs(B_direct.value).max()
+
+    # Weighted sum of the modes fields
+    B_basis = field.compute_field(0)
+    np.testing.assert_allclose(B_basis.value, B_direct.value, atol=tolerance)
+
+    # Batch of mode amplitudes (including the ones of the field above)
+    modes_normalizations = [{name: disk_parameters[name]
+                             for name in ('mode_1', 'mode_2', 'mode_4')},
+                            {'mode_3': 1*u.microgauss},
+                            {}]
+    B_batch = field.compute_field_batch(modes_normalizations)
+    assert B_batch.shape == (3,) + B_direct.shape
+    np.testing.assert_allclose(B_batch[0].value, B_direct.value,
+                               atol=tolerance)
+    np.testing.assert_array_equal(B_batch[2].value, 0)
+
+    modified_parameters = dict(disk_parameters, mode_1=0*u.microgauss,
+                               mode_2=0*u.microgauss, mode_3=1*u.microgauss,
+                               mode_4=0*u.microgauss)
+    B_mode_3 = GalMagDiskField(grid,
+                               parameters=modified_parameters).compute_field(0)
+    np.testing.assert_allclose(B_batch[1].value, B_mode_3.value,
+                               atol=tolerance)
+
+    # Unknown modes are not silently ignored
+    with pytest.raises(ValueError):
+        field.compute_field_batch([{'mode_5': 1*u.microgauss}])
+
+    # The basis is recomputed if other parameters are modified in place
+    field.parameters['disk_radius'] += 3*u.kpc
+    B_basis = field.compute_field(1)
+    modified_parameters = dict(disk_parameters, disk_radius=20*u.kpc)
+    B_expected = GalMagDiskField(grid,
+                                 parameters=modified_parameters).compute_field(0)
+    np.testing.assert_allclose(B_basis.value, B_expected.value,
+                               atol=tolerance)
+    assert not np.allclose(B_basis.value, B_direct.value)